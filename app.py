@@ -1,18 +1,98 @@
 import os
 import logging
+import threading
+import uuid
+from collections import OrderedDict
+import orjson
+import redis
+import zstandard
 from flask import Flask, render_template, request, session, jsonify, redirect, url_for, flash
+from flask.json.provider import DefaultJSONProvider
+from flask_session import Session
 from pii_detector import PIIDetector
-from llm_client import LLMClient
+from llm_client import LLMClient, MessageBatcher, connection_key
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with orjson"""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        option = orjson.OPT_SORT_KEYS if self.sort_keys else 0
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
+# Keep sessions, including the growing chat history, server-side in Redis when
+# configured, so the cookie only carries a session id instead of the whole history
+redis_url = os.environ.get("REDIS_URL")
+if redis_url:
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis.from_url(redis_url)
+    Session(app)
+
 # Initialize PII detector
 pii_detector = PIIDetector()
 
+# Long-lived LLM clients, keyed by connection_key (which hashes the API key),
+# so each configuration is built once and reused across requests. Bounded,
+# and entries are dropped on failed configuration and on disconnect, so
+# clients (and the keys they hold) do not outlive their sessions.
+_CLIENT_CACHE_SIZE = 128
+_CLIENT_CACHE: OrderedDict[tuple, LLMClient] = OrderedDict()
+_CLIENT_CACHE_LOCK = threading.Lock()
+
+def get_client(api_key: str, api_endpoint: str, api_provider: str) -> LLMClient:
+    """Return the cached LLM client for these settings, creating it on first use"""
+    key = connection_key(api_key, api_endpoint, api_provider)
+    with _CLIENT_CACHE_LOCK:
+        llm_client = _CLIENT_CACHE.get(key)
+        if llm_client is None:
+            llm_client = LLMClient(api_key, api_endpoint, api_provider)
+            _CLIENT_CACHE[key] = llm_client
+            if len(_CLIENT_CACHE) > _CLIENT_CACHE_SIZE:
+                _CLIENT_CACHE.popitem(last=False)
+        else:
+            _CLIENT_CACHE.move_to_end(key)
+    return llm_client
+
+def drop_client(api_key: str, api_endpoint: str, api_provider: str) -> None:
+    """Remove the cached LLM client for these settings, if any"""
+    with _CLIENT_CACHE_LOCK:
+        _CLIENT_CACHE.pop(connection_key(api_key, api_endpoint, api_provider), None)
+
+# Messages a session sends while one of its requests is in flight go out
+# together as one LLM request once it finishes. Only several tabs sharing a
+# session can send such messages, and each then waits for the earlier reply,
+# so batching is off unless BATCH_MESSAGES is set
+message_batcher = MessageBatcher() if os.environ.get("BATCH_MESSAGES") else None
+
+# With server-side sessions, long assistant responses are stored
+# zstd-compressed in the chat history, tagged with a prefix so plain entries
+# still render. Cookie sessions are left alone: itsdangerous already
+# zlib-compresses the cookie, and compressed bytes would only grow it once
+# base64-encoded.
+_COMPRESSED_PREFIX = b'\x00zstd'
+_COMPRESS_MIN_LENGTH = 1024
+
+def _compress_response(response: str):
+    """Compress an assistant response for storage in the session, if worthwhile"""
+    if not redis_url or len(response) < _COMPRESS_MIN_LENGTH:
+        return response
+    return _COMPRESSED_PREFIX + zstandard.compress(response.encode('utf-8'), 3)
+
+def _decompress_response(stored) -> str:
+    """Restore an assistant response stored by _compress_response"""
+    if isinstance(stored, bytes) and stored.startswith(_COMPRESSED_PREFIX):
+        return zstandard.decompress(stored[len(_COMPRESSED_PREFIX):]).decode('utf-8')
+    return stored
+
 @app.route('/')
 def index():
     """Main page for API configuration"""
@@ -47,10 +127,12 @@ def configure_api():
     session['api_endpoint'] = api_endpoint
     session['api_provider'] = api_provider
     session['chat_history'] = []
+    session['batch_id'] = uuid.uuid4().hex
     
-    # Test API connection
-    llm_client = LLMClient(api_key, api_endpoint, api_provider)
-    if not llm_client.test_connection():
+    # Test API connection without spending tokens on a test completion
+    llm_client = get_client(api_key, api_endpoint, api_provider)
+    if not llm_client.test_connection_fast():
+        drop_client(api_key, api_endpoint, api_provider)
         flash('Failed to connect to API. Please check your credentials.', 'error')
         return redirect(url_for('index'))
     
@@ -64,8 +146,12 @@ def chat():
         flash('Please configure your API first', 'error')
         return redirect(url_for('index'))
     
+    chat_history = [
+        dict(entry, assistant_response=_decompress_response(entry['assistant_response']))
+        for entry in session.get('chat_history', [])
+    ]
     return render_template('chat.html', 
-                         chat_history=session.get('chat_history', []),
+                         chat_history=chat_history,
                          api_provider=session.get('api_provider', 'openai'))
 
 @app.route('/send_message', methods=['POST'])
@@ -83,19 +169,28 @@ def send_message():
         # Detect and redact PII
         redacted_message, redactions = pii_detector.redact_pii(user_message)
         
-        # Initialize LLM client
-        llm_client = LLMClient(
+        # Get the cached LLM client for this configuration
+        llm_client = get_client(
             session['api_key'], 
             session['api_endpoint'], 
             session['api_provider']
         )
         
-        # Send redacted message to LLM
-        response = llm_client.send_message(redacted_message)
+        # Send redacted message to LLM, batched with this session's other pending messages
+        if message_batcher is None:
+            response, owns_response = llm_client.send_message(redacted_message), True
+        else:
+            batch_key = session.setdefault('batch_id', uuid.uuid4().hex)
+            response, owns_response = message_batcher.send_message(batch_key, llm_client, redacted_message)
         
         if response is None:
             return jsonify({'error': 'Failed to get response from LLM API'}), 500
         
+        # A merged reply answers the whole batch, so only the caller of its
+        # last message shows and stores it; the others are marked as merged
+        if not owns_response:
+            response = None
+        
         # Store in chat history
         if 'chat_history' not in session:
             session['chat_history'] = []
@@ -104,7 +199,7 @@ def send_message():
             'user_message': user_message,
             'redacted_message': redacted_message,
             'redactions': redactions,
-            'assistant_response': response
+            'assistant_response': _compress_response(response) if owns_response else None
         })
         session.modified = True
         
@@ -113,7 +208,8 @@ def send_message():
             'user_message': user_message,
             'redacted_message': redacted_message,
             'redactions': redactions,
-            'assistant_response': response
+            'assistant_response': response,
+            'merged_into_next': not owns_response
         })
         
     except Exception as e:
@@ -130,6 +226,8 @@ def clear_chat():
 @app.route('/disconnect')
 def disconnect():
     """Disconnect from API and clear session"""
+    if 'api_key' in session:
+        drop_client(session['api_key'], session['api_endpoint'], session['api_provider'])
     session.clear()
     flash('Disconnected successfully', 'info')
     return redirect(url_for('index'))
@@ -62,8 +62,12 @@ async function sendMessage() {
         hideTypingIndicator();
         
         if (response.ok && data.success) {
-            // Add assistant response
-            addAssistantMessage(data.assistant_response);
+            // Add assistant response, or note that a later message's reply covers it
+            if (data.merged_into_next) {
+                addMergedNotice();
+            } else {
+                addAssistantMessage(data.assistant_response);
+            }
             
             // Update the user message with redaction info if any
             if (data.redactions && data.redactions.length > 0) {
@@ -128,6 +132,24 @@ function addAssistantMessage(message) {
     scrollToBottom();
 }
 
+// Note that a message was answered together with a later one
+function addMergedNotice() {
+    const chatMessages = document.getElementById('chat-messages');
+    
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant-message';
+    messageDiv.innerHTML = `
+        <div class="message-content">
+            <div class="message-text text-muted">
+                <small><i class="fas fa-link"></i> Answered together with a later message.</small>
+            </div>
+        </div>
+    `;
+    
+    chatMessages.appendChild(messageDiv);
+    scrollToBottom();
+}
+
 // Add error message to chat
 function addErrorMessage(errorText) {
     const chatMessages = document.getElementById('chat-messages');
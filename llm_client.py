@@ -1,7 +1,58 @@
-import requests
-import json
+import atexit
+import copy
+import hashlib
 import logging
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Union
+
+import httpx
+import orjson
+
+# The HTTP/2 stack logs every header it encodes at DEBUG, including the
+# x-api-key and Authorization headers, and httpx logs request URLs, which
+# carry the Gemini ?key= parameter; keep them out of the app's DEBUG logs
+for _logger_name in ('hpack', 'h2', 'httpcore', 'httpx'):
+    logging.getLogger(_logger_name).setLevel(logging.WARNING)
+
+# One connection pool shared by every LLMClient, so concurrent requests from
+# all users reuse keep-alive connections to each provider host. HTTP/2 lets
+# in-flight requests to the same host multiplex over a single connection.
+_http_client = httpx.Client(
+    http2=True,
+    timeout=30,
+    limits=httpx.Limits(max_keepalive_connections=100)
+)
+atexit.register(_http_client.close)
+
+# In-process LRU of successful responses, keyed by
+# (provider, endpoint, api key hash, message, test_mode)
+_RESPONSE_CACHE_SIZE = 1024
+_response_cache: OrderedDict[tuple, str] = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# (provider, endpoint, api key hash) combinations that passed test_connection
+_verified_connections = set()
+
+def connection_key(api_key: str, endpoint: str, provider: str) -> tuple:
+    """Identify an API configuration without holding the raw API key"""
+    return (provider.lower(), endpoint, hashlib.sha256(api_key.encode()).hexdigest())
+
+def _get_cached_response(key: tuple) -> Optional[str]:
+    """Return a cached response and mark it as most recently used"""
+    with _response_cache_lock:
+        response = _response_cache.get(key)
+        if response is not None:
+            _response_cache.move_to_end(key)
+        return response
+
+def _cache_response(key: tuple, response: str) -> None:
+    """Store a response, evicting the least recently used one when full"""
+    with _response_cache_lock:
+        _response_cache[key] = response
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > _RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
 
 class LLMClient:
     """Client for communicating with various LLM APIs"""
@@ -10,269 +61,327 @@ class LLMClient:
         self.api_key = api_key
         self.endpoint = endpoint
         self.provider = provider.lower()
-        self.session = requests.Session()
+        self.session = _http_client
+        self.headers = {}
+        self._request_url = endpoint
+        self._cache_key = connection_key(api_key, endpoint, provider)
+        
+        # Payload skeletons for normal and test messages, built once; each send
+        # copies one and fills in only the messages
+        self._spec = _PROVIDER_SPECS.get(self.provider, _PROVIDER_SPECS['generic'])
+        self._payload_templates = {
+            False: self._spec['build_payload'](1000),
+            True: self._spec['build_payload'](150)
+        }
         
         # Set up headers based on provider
         if self.provider == 'openai':
-            self.session.headers.update({
+            self.headers.update({
                 'Authorization': f'Bearer {api_key}',
                 'Content-Type': 'application/json'
             })
         elif self.provider == 'anthropic':
-            self.session.headers.update({
+            self.headers.update({
                 'x-api-key': api_key,
                 'Content-Type': 'application/json',
                 'anthropic-version': '2023-06-01'
             })
         elif self.provider == 'gemini':
-            self.session.headers.update({
+            # The key goes in a header rather than a ?key= query parameter,
+            # since request URLs end up in httpx error messages and logs
+            self.headers.update({
+                'x-goog-api-key': api_key,
                 'Content-Type': 'application/json'
             })
-            # Gemini uses API key as query parameter
-            self.api_key_param = f'?key={api_key}'
+            self._request_url = f"{endpoint}/gemini-1.5-flash:generateContent"
         elif self.provider == 'deepseek':
-            self.session.headers.update({
+            self.headers.update({
                 'Authorization': f'Bearer {api_key}',
                 'Content-Type': 'application/json'
             })
         elif self.provider == 'grok':
-            self.session.headers.update({
+            self.headers.update({
                 'Authorization': f'Bearer {api_key}',
                 'Content-Type': 'application/json'
             })
         else:
             # Generic setup
-            self.session.headers.update({
+            self.headers.update({
                 'Authorization': f'Bearer {api_key}',
                 'Content-Type': 'application/json'
             })
     
     def test_connection(self) -> bool:
         """Test if the API connection is working"""
+        if self._cache_key in _verified_connections:
+            return True
         try:
             response = self.send_message("Hello", test_mode=True)
-            return response is not None
+            if response is None:
+                return False
+            _verified_connections.add(self._cache_key)
+            return True
         except Exception as e:
             logging.error(f"Connection test failed: {str(e)}")
             return False
     
-    def send_message(self, message: str, test_mode: bool = False) -> Optional[str]:
-        """Send message to LLM and return response"""
-        try:
-            if self.provider == 'openai':
-                return self._send_openai_message(message, test_mode)
-            elif self.provider == 'anthropic':
-                return self._send_anthropic_message(message, test_mode)
-            elif self.provider == 'gemini':
-                return self._send_gemini_message(message, test_mode)
-            elif self.provider == 'deepseek':
-                return self._send_deepseek_message(message, test_mode)
-            elif self.provider == 'grok':
-                return self._send_grok_message(message, test_mode)
-            else:
-                return self._send_generic_message(message, test_mode)
-        except Exception as e:
-            logging.error(f"Error sending message to {self.provider}: {str(e)}")
-            return None
-    
-    def _send_openai_message(self, message: str, test_mode: bool = False) -> Optional[str]:
-        """Send message to OpenAI API"""
-        test_message = "Hi" if test_mode else message
+    def test_connection_fast(self) -> bool:
+        """Test the API key by listing models, which costs no tokens"""
+        if self._cache_key in _verified_connections:
+            return True
         
-        payload = {
-            "model": "gpt-3.5-turbo",
-            "messages": [
-                {"role": "user", "content": test_message}
-            ],
-            "max_tokens": 150 if test_mode else 1000,
-            "temperature": 0.7
-        }
+        models_url = self._get_models_url()
+        if models_url is None:
+            # No known models endpoint, fall back to a real test message
+            return self.test_connection()
         
         try:
-            response = self.session.post(self.endpoint, json=payload, timeout=30)
+            response = self.session.get(models_url, headers=self.headers)
             response.raise_for_status()
-            
-            data = response.json()
-            if 'choices' in data and len(data['choices']) > 0:
-                return data['choices'][0]['message']['content'].strip()
-            
-        except requests.exceptions.RequestException as e:
-            logging.error(f"OpenAI API request failed: {str(e)}")
-        except KeyError as e:
-            logging.error(f"Unexpected OpenAI API response format: {str(e)}")
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse OpenAI API response: {str(e)}")
+        except httpx.HTTPError as e:
+            logging.error(f"Connection test failed: {str(e)}")
+            return False
         
-        return None
+        _verified_connections.add(self._cache_key)
+        return True
     
-    def _send_anthropic_message(self, message: str, test_mode: bool = False) -> Optional[str]:
-        """Send message to Anthropic API"""
-        test_message = "Hi" if test_mode else message
-        
-        payload = {
-            "model": "claude-3-sonnet-20240229",
-            "max_tokens": 150 if test_mode else 1000,
-            "messages": [
-                {"role": "user", "content": test_message}
-            ]
-        }
-        
-        try:
-            response = self.session.post(self.endpoint, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            if 'content' in data and len(data['content']) > 0:
-                return data['content'][0]['text'].strip()
-            
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Anthropic API request failed: {str(e)}")
-        except KeyError as e:
-            logging.error(f"Unexpected Anthropic API response format: {str(e)}")
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse Anthropic API response: {str(e)}")
-        
+    def _get_models_url(self) -> Optional[str]:
+        """Return the provider's model listing URL, derived from the chat endpoint"""
+        if self.provider in ('openai', 'deepseek', 'grok') and self.endpoint.endswith('/chat/completions'):
+            return self.endpoint[:-len('/chat/completions')] + '/models'
+        if self.provider == 'anthropic' and self.endpoint.endswith('/messages'):
+            return self.endpoint[:-len('/messages')] + '/models'
+        if self.provider == 'gemini':
+            # The Gemini endpoint is already the models collection
+            return self.endpoint
         return None
     
-    def _send_generic_message(self, message: str, test_mode: bool = False) -> Optional[str]:
-        """Send message to generic/custom API"""
-        test_message = "Hi" if test_mode else message
-        
-        # Try OpenAI format first
-        payload = {
-            "model": "default",
-            "messages": [
-                {"role": "user", "content": test_message}
-            ],
-            "max_tokens": 150 if test_mode else 1000,
-            "temperature": 0.7
-        }
+    def send_message(self, message: Union[str, List[str]], test_mode: bool = False) -> Optional[str]:
+        """Send message, or several consecutive user messages, to LLM and return response"""
+        messages = [message] if isinstance(message, str) else list(message)
+        cache_key = self._cache_key + (tuple(messages), test_mode)
+        response = _get_cached_response(cache_key)
+        if response is not None:
+            return response
         
         try:
-            response = self.session.post(self.endpoint, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Try OpenAI format
-            if 'choices' in data and len(data['choices']) > 0:
-                return data['choices'][0]['message']['content'].strip()
-            
-            # Try Anthropic format
-            if 'content' in data and len(data['content']) > 0:
-                return data['content'][0]['text'].strip()
-            
-            # Try simple response format
-            if 'response' in data:
-                return data['response'].strip()
-            
-            # Try text field
-            if 'text' in data:
-                return data['text'].strip()
-            
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Generic API request failed: {str(e)}")
-        except KeyError as e:
-            logging.error(f"Unexpected API response format: {str(e)}")
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse API response: {str(e)}")
+            response = self._send_provider_message(messages, test_mode)
+        except Exception as e:
+            logging.error(f"Error sending message to {self.provider}: {str(e)}")
+            return None
         
-        return None
+        # Failed requests return None and are not cached, so they are retried
+        if response is not None:
+            _cache_response(cache_key, response)
+        return response
     
-    def _send_gemini_message(self, message: str, test_mode: bool = False) -> Optional[str]:
-        """Send message to Gemini API"""
-        test_message = "Hi" if test_mode else message
-        
-        # Use generateContent endpoint for Gemini
-        endpoint = f"{self.endpoint}/gemini-1.5-flash:generateContent{getattr(self, 'api_key_param', '')}"
-        
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": test_message
-                }]
-            }],
-            "generationConfig": {
-                "maxOutputTokens": 150 if test_mode else 1000,
-                "temperature": 0.7
-            }
-        }
+    def _send_provider_message(self, messages: List[str], test_mode: bool = False) -> Optional[str]:
+        """Send messages using this provider's entry in _PROVIDER_SPECS"""
+        spec = self._spec
+        payload = copy.copy(self._payload_templates[test_mode])
+        spec['fill_messages'](payload, ["Hi"] if test_mode else messages)
         
         try:
-            response = self.session.post(endpoint, json=payload, timeout=30)
+            response = self.session.post(self._request_url, content=orjson.dumps(payload), headers=self.headers)
             response.raise_for_status()
             
-            data = response.json()
-            if 'candidates' in data and len(data['candidates']) > 0:
-                parts = data['candidates'][0].get('content', {}).get('parts', [])
-                if parts and 'text' in parts[0]:
-                    return parts[0]['text'].strip()
+            return spec['parse'](orjson.loads(response.content))
             
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Gemini API request failed: {str(e)}")
+        except httpx.HTTPError as e:
+            logging.error(f"{spec['label']} API request failed: {str(e)}")
         except KeyError as e:
-            logging.error(f"Unexpected Gemini API response format: {str(e)}")
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse Gemini API response: {str(e)}")
+            logging.error(f"Unexpected {spec['label']} API response format: {str(e)}")
+        except orjson.JSONDecodeError as e:
+            logging.error(f"Failed to parse {spec['label']} API response: {str(e)}")
         
         return None
-    
-    def _send_deepseek_message(self, message: str, test_mode: bool = False) -> Optional[str]:
-        """Send message to DeepSeek API"""
-        test_message = "Hi" if test_mode else message
-        
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "user", "content": test_message}
-            ],
-            "max_tokens": 150 if test_mode else 1000,
+
+def _chat_completions_payload(model: str):
+    """Build an OpenAI-style chat completions skeleton builder for model"""
+    def build_payload(max_tokens: int) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "messages": [],
+            "max_tokens": max_tokens,
             "temperature": 0.7
         }
-        
-        try:
-            response = self.session.post(self.endpoint, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            if 'choices' in data and len(data['choices']) > 0:
-                return data['choices'][0]['message']['content'].strip()
-            
-        except requests.exceptions.RequestException as e:
-            logging.error(f"DeepSeek API request failed: {str(e)}")
-        except KeyError as e:
-            logging.error(f"Unexpected DeepSeek API response format: {str(e)}")
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse DeepSeek API response: {str(e)}")
-        
-        return None
-    
-    def _send_grok_message(self, message: str, test_mode: bool = False) -> Optional[str]:
-        """Send message to Grok API"""
-        test_message = "Hi" if test_mode else message
-        
-        payload = {
-            "model": "grok-beta",
-            "messages": [
-                {"role": "user", "content": test_message}
-            ],
-            "max_tokens": 150 if test_mode else 1000,
+    return build_payload
+
+def _anthropic_payload(max_tokens: int) -> Dict[str, Any]:
+    """Build an Anthropic messages payload skeleton"""
+    return {
+        "model": "claude-3-sonnet-20240229",
+        "max_tokens": max_tokens,
+        "messages": []
+    }
+
+def _gemini_payload(max_tokens: int) -> Dict[str, Any]:
+    """Build a Gemini generateContent payload skeleton"""
+    return {
+        "contents": [],
+        "generationConfig": {
+            "maxOutputTokens": max_tokens,
             "temperature": 0.7
         }
+    }
+
+def _fill_chat_messages(payload: Dict[str, Any], messages: List[str]) -> None:
+    """Set the user turns of a chat completions or Anthropic payload"""
+    payload["messages"] = [
+        {"role": "user", "content": message} for message in messages
+    ]
+
+def _fill_gemini_messages(payload: Dict[str, Any], messages: List[str]) -> None:
+    """Set the user parts of a Gemini payload"""
+    payload["contents"] = [{
+        "parts": [{
+            "text": message
+        } for message in messages]
+    }]
+
+def _parse_chat_completions_response(data: Dict[str, Any]) -> Optional[str]:
+    """Extract the reply from an OpenAI-style response"""
+    if 'choices' in data and len(data['choices']) > 0:
+        return data['choices'][0]['message']['content'].strip()
+    return None
+
+def _parse_anthropic_response(data: Dict[str, Any]) -> Optional[str]:
+    """Extract the reply from an Anthropic response"""
+    if 'content' in data and len(data['content']) > 0:
+        return data['content'][0]['text'].strip()
+    return None
+
+def _parse_gemini_response(data: Dict[str, Any]) -> Optional[str]:
+    """Extract the reply from a Gemini response"""
+    if 'candidates' in data and len(data['candidates']) > 0:
+        parts = data['candidates'][0].get('content', {}).get('parts', [])
+        if parts and 'text' in parts[0]:
+            return parts[0]['text'].strip()
+    return None
+
+def _parse_generic_response(data: Dict[str, Any]) -> Optional[str]:
+    """Extract the reply from a generic/custom API response"""
+    # Try OpenAI format
+    if 'choices' in data and len(data['choices']) > 0:
+        return data['choices'][0]['message']['content'].strip()
+    
+    # Try Anthropic format
+    if 'content' in data and len(data['content']) > 0:
+        return data['content'][0]['text'].strip()
+    
+    # Try simple response format
+    if 'response' in data:
+        return data['response'].strip()
+    
+    # Try text field
+    if 'text' in data:
+        return data['text'].strip()
+    
+    return None
+
+# How to build and parse a message for each provider; unknown providers
+# use 'generic', which tries the OpenAI format first
+_PROVIDER_SPECS = {
+    'openai': {
+        'label': 'OpenAI',
+        'build_payload': _chat_completions_payload("gpt-3.5-turbo"),
+        'fill_messages': _fill_chat_messages,
+        'parse': _parse_chat_completions_response
+    },
+    'anthropic': {
+        'label': 'Anthropic',
+        'build_payload': _anthropic_payload,
+        'fill_messages': _fill_chat_messages,
+        'parse': _parse_anthropic_response
+    },
+    'gemini': {
+        'label': 'Gemini',
+        'build_payload': _gemini_payload,
+        'fill_messages': _fill_gemini_messages,
+        'parse': _parse_gemini_response
+    },
+    'deepseek': {
+        'label': 'DeepSeek',
+        'build_payload': _chat_completions_payload("deepseek-chat"),
+        'fill_messages': _fill_chat_messages,
+        'parse': _parse_chat_completions_response
+    },
+    'grok': {
+        'label': 'Grok',
+        'build_payload': _chat_completions_payload("grok-beta"),
+        'fill_messages': _fill_chat_messages,
+        'parse': _parse_chat_completions_response
+    },
+    'generic': {
+        'label': 'Generic',
+        'build_payload': _chat_completions_payload("default"),
+        'fill_messages': _fill_chat_messages,
+        'parse': _parse_generic_response
+    }
+}
+
+class _PendingBatch:
+    """Messages from one chat session sent together in one request"""
+    
+    def __init__(self):
+        self.messages: List[str] = []
+        self.response: Optional[str] = None
+        self.done = threading.Event()
+
+class MessageBatcher:
+    """
+    Sends each chat session's messages one request at a time. A message with
+    nothing in flight for its session is sent at once; messages arriving
+    while a request is in flight are merged and sent together when it ends.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, _PendingBatch] = {}
+        self._queued: Dict[str, _PendingBatch] = {}
+    
+    def send_message(self, batch_key: str, llm_client: 'LLMClient', message: str) -> Tuple[Optional[str], bool]:
+        """
+        Send message through llm_client, merged with any other messages for
+        the same batch_key that queue up behind an in-flight request.
+        Returns (response, owns_response): every caller in a batch receives
+        the combined response, but only the caller of the batch's last
+        message owns it, so it is stored once.
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(batch_key)
+            if in_flight is None:
+                batch = _PendingBatch()
+                self._in_flight[batch_key] = batch
+                is_sender = True
+            else:
+                batch = self._queued.get(batch_key)
+                is_sender = batch is None
+                if is_sender:
+                    batch = _PendingBatch()
+                    self._queued[batch_key] = batch
+            batch.messages.append(message)
+            index = len(batch.messages) - 1
         
-        try:
-            response = self.session.post(self.endpoint, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            if 'choices' in data and len(data['choices']) > 0:
-                return data['choices'][0]['message']['content'].strip()
-            
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Grok API request failed: {str(e)}")
-        except KeyError as e:
-            logging.error(f"Unexpected Grok API response format: {str(e)}")
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse Grok API response: {str(e)}")
+        if is_sender:
+            if in_flight is not None:
+                # The in-flight request hands this batch over when it ends
+                in_flight.done.wait()
+            self._send(batch_key, batch, llm_client)
+        else:
+            batch.done.wait()
         
-        return None
+        return batch.response, index == len(batch.messages) - 1
+    
+    def _send(self, batch_key: str, batch: _PendingBatch, llm_client: 'LLMClient') -> None:
+        """Send a batch, then make the next queued batch for batch_key in flight"""
+        try:
+            batch.response = llm_client.send_message(batch.messages)
+        finally:
+            with self._lock:
+                queued = self._queued.pop(batch_key, None)
+                if queued is None:
+                    del self._in_flight[batch_key]
+                else:
+                    self._in_flight[batch_key] = queued
+            batch.done.set()
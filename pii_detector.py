@@ -1,63 +1,227 @@
 import re
+import sys
+import logging
 import random
-from typing import List, Tuple, Dict
+from functools import cached_property, lru_cache
+from typing import List, Tuple, Dict, Optional
+
+try:
+    # RE2 scans in linear time, so the combined PII pattern cannot backtrack
+    # catastrophically on adversarial input
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    # Aho-Corasick finds every known name in a single pass over the text
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Common first names (subset for detection), interned so membership tests
+# can short-circuit on identity
+_COMMON_FIRST_NAMES = frozenset(sys.intern(name) for name in (
+    'james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda',
+    'william', 'elizabeth', 'david', 'barbara', 'richard', 'susan', 'joseph', 'jessica',
+    'thomas', 'sarah', 'charles', 'karen', 'christopher', 'nancy', 'daniel', 'lisa',
+    'matthew', 'betty', 'anthony', 'helen', 'mark', 'sandra', 'donald', 'donna',
+    'steven', 'carol', 'paul', 'ruth', 'andrew', 'sharon', 'joshua', 'michelle',
+    'kenneth', 'laura', 'kevin', 'sarah', 'brian', 'kimberly', 'george', 'deborah',
+    'timothy', 'dorothy', 'ronald', 'lisa', 'jason', 'nancy', 'edward', 'karen',
+    'jeffrey', 'betty', 'ryan', 'helen', 'jacob', 'sandra', 'gary', 'donna',
+    'nicholas', 'carol', 'eric', 'ruth', 'jonathan', 'sharon', 'stephen', 'michelle',
+    'larry', 'laura', 'justin', 'sarah', 'scott', 'kimberly', 'brandon', 'deborah',
+    'benjamin', 'dorothy', 'samuel', 'amy', 'gregory', 'angela', 'alexander', 'ashley',
+    'patrick', 'brenda', 'frank', 'emma', 'raymond', 'olivia', 'jack', 'cynthia'
+))
+
+# Common last names (subset for detection)
+_COMMON_LAST_NAMES = frozenset(sys.intern(name) for name in (
+    'smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis',
+    'rodriguez', 'martinez', 'hernandez', 'lopez', 'gonzalez', 'wilson', 'anderson',
+    'thomas', 'taylor', 'moore', 'jackson', 'martin', 'lee', 'perez', 'thompson',
+    'white', 'harris', 'sanchez', 'clark', 'ramirez', 'lewis', 'robinson', 'walker',
+    'young', 'allen', 'king', 'wright', 'scott', 'torres', 'nguyen', 'hill',
+    'flores', 'green', 'adams', 'nelson', 'baker', 'hall', 'rivera', 'campbell',
+    'mitchell', 'carter', 'roberts', 'gomez', 'phillips', 'evans', 'turner', 'diaz',
+    'parker', 'cruz', 'edwards', 'collins', 'reyes', 'stewart', 'morris', 'morales',
+    'murphy', 'cook', 'rogers', 'gutierrez', 'ortiz', 'morgan', 'cooper', 'peterson',
+    'bailey', 'reed', 'kelly', 'howard', 'ramos', 'kim', 'cox', 'ward', 'richardson',
+    'watson', 'brooks', 'chavez', 'wood', 'james', 'bennett', 'gray', 'mendoza'
+))
+
+_STREET_TYPES = ['Street', 'St', 'Avenue', 'Ave', 'Road', 'Rd', 'Boulevard', 'Blvd',
+                 'Lane', 'Ln', 'Drive', 'Dr', 'Court', 'Ct', 'Place', 'Pl']
+
+# RE2's \d and \s are ASCII-only, so patterns are rewritten with the Unicode
+# classes stdlib re uses. RE2 has no Unicode \b, so patterns using it stay on re
+_RE2_SPACE = r'\t\n\v\f\r\x1c-\x1f\x85\p{Z}'
+
+def _re2_source(source: str) -> Optional[str]:
+    """Rewrite a stdlib pattern for RE2, or None if RE2 cannot match it the same way"""
+    rewritten = []
+    in_class = False
+    position = 0
+    while position < len(source):
+        char = source[position]
+        if char == '\\':
+            escape = source[position + 1]
+            if escape == 'd':
+                rewritten.append(r'\p{Nd}')
+            elif escape == 's':
+                rewritten.append(_RE2_SPACE if in_class else f'[{_RE2_SPACE}]')
+            elif escape in 'bBwWDS':
+                return None
+            else:
+                rewritten.append(source[position:position + 2])
+            position += 2
+            continue
+        if char == '[' and not in_class:
+            in_class = True
+        elif char == ']' and in_class:
+            in_class = False
+        rewritten.append(char)
+        position += 1
+    return ''.join(rewritten)
+
+# Inputs both engines must scan identically before RE2 is used
+_ENGINE_PARITY_SAMPLES = (
+    'SSN １２３-４５-６７８９, zip ９０２１０, SSN ١٢٣-٤٥-٦٧٨٩',
+    'Ünternehmen 123-45-6789é, éé12345, 1١2 Oak St',
+    'Call me at 555\u00a0123\u00a04567, (555)\u2009123\u20094567 or 555\v123\v4567',
+    '12 Main ſt, 12 Main Ct, 12 Main \u212at, 12\vOak St, 12\u00a0Oak\u00a0Street',
+    'mail jösé@exämple.com or jose@example.com, born 01/02/1990é',
+)
+
+def _is_word_char(char: str) -> bool:
+    """Match the characters regex treats as \\w"""
+    return char.isalnum() or char == '_'
 
 class PIIDetector:
     """Detects and redacts Personally Identifiable Information (PII) from text"""
     
+    common_first_names = _COMMON_FIRST_NAMES
+    common_last_names = _COMMON_LAST_NAMES
+    
     def __init__(self):
-        # Common first names (subset for detection)
-        self.common_first_names = {
-            'james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda',
-            'william', 'elizabeth', 'david', 'barbara', 'richard', 'susan', 'joseph', 'jessica',
-            'thomas', 'sarah', 'charles', 'karen', 'christopher', 'nancy', 'daniel', 'lisa',
-            'matthew', 'betty', 'anthony', 'helen', 'mark', 'sandra', 'donald', 'donna',
-            'steven', 'carol', 'paul', 'ruth', 'andrew', 'sharon', 'joshua', 'michelle',
-            'kenneth', 'laura', 'kevin', 'sarah', 'brian', 'kimberly', 'george', 'deborah',
-            'timothy', 'dorothy', 'ronald', 'lisa', 'jason', 'nancy', 'edward', 'karen',
-            'jeffrey', 'betty', 'ryan', 'helen', 'jacob', 'sandra', 'gary', 'donna',
-            'nicholas', 'carol', 'eric', 'ruth', 'jonathan', 'sharon', 'stephen', 'michelle',
-            'larry', 'laura', 'justin', 'sarah', 'scott', 'kimberly', 'brandon', 'deborah',
-            'benjamin', 'dorothy', 'samuel', 'amy', 'gregory', 'angela', 'alexander', 'ashley',
-            'patrick', 'brenda', 'frank', 'emma', 'raymond', 'olivia', 'jack', 'cynthia'
-        }
+        # Private generator for synthetic replacement values
+        self._rng = random.Random()
         
-        # Common last names (subset for detection)
-        self.common_last_names = {
-            'smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis',
-            'rodriguez', 'martinez', 'hernandez', 'lopez', 'gonzalez', 'wilson', 'anderson',
-            'thomas', 'taylor', 'moore', 'jackson', 'martin', 'lee', 'perez', 'thompson',
-            'white', 'harris', 'sanchez', 'clark', 'ramirez', 'lewis', 'robinson', 'walker',
-            'young', 'allen', 'king', 'wright', 'scott', 'torres', 'nguyen', 'hill',
-            'flores', 'green', 'adams', 'nelson', 'baker', 'hall', 'rivera', 'campbell',
-            'mitchell', 'carter', 'roberts', 'gomez', 'phillips', 'evans', 'turner', 'diaz',
-            'parker', 'cruz', 'edwards', 'collins', 'reyes', 'stewart', 'morris', 'morales',
-            'murphy', 'cook', 'rogers', 'gutierrez', 'ortiz', 'morgan', 'cooper', 'peterson',
-            'bailey', 'reed', 'kelly', 'howard', 'ramos', 'kim', 'cox', 'ward', 'richardson',
-            'watson', 'brooks', 'chavez', 'wood', 'james', 'bennett', 'gray', 'mendoza'
+        # Replacement generator for each PII type
+        self._replacement_generators = {
+            'email': self._generate_fake_email,
+            'phone': self._generate_fake_phone,
+            'ssn': self._generate_fake_ssn,
+            'date_of_birth': self._generate_fake_date,
+            'address': self._generate_fake_address,
+            'zip_code': self._generate_fake_zip,
+            'name': self._generate_fake_name
         }
         
-        # Regex patterns for various PII types
-        self.patterns = {
+        # Redaction is pure apart from the synthetic values, so results for
+        # repeated text are reused; a repeated prompt keeps its replacements
+        self._redact_cache = lru_cache(maxsize=512)(self._redact_pii_impl)
+    
+    # Patterns and matchers are built on first use rather than at
+    # construction, so creating a detector at import time costs nothing
+    
+    @cached_property
+    def patterns(self) -> Dict[str, re.Pattern]:
+        """Regex patterns for various PII types"""
+        return {
             'email': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
             'phone': re.compile(r'(\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})'),
             'ssn': re.compile(r'\b\d{3}-?\d{2}-?\d{4}\b'),
             'date_of_birth': re.compile(r'\b(0?[1-9]|1[0-2])[/-](0?[1-9]|[12][0-9]|3[01])[/-](19|20)\d{2}\b|\b(19|20)\d{2}[/-](0?[1-9]|1[0-2])[/-](0?[1-9]|[12][0-9]|3[01])\b'),
-            'address': re.compile(r'\d+\s+[A-Za-z0-9\s,.-]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr|Court|Ct|Place|Pl)\b', re.IGNORECASE),
+            'address': re.compile(rf'\d+\s+[A-Za-z0-9\s,.-]+(?:{"|".join(_STREET_TYPES)})\b', re.IGNORECASE),
             'zip_code': re.compile(r'\b\d{5}(-\d{4})?\b')
         }
     
+    @cached_property
+    def _combined(self):
+        """
+        All patterns combined into one named-group alternation so the text
+        is scanned once; the group name of a match is its PII type. Uses
+        RE2 when google-re2 is installed, every pattern can be rewritten for
+        it, and it agrees with the stdlib engine.
+        """
+        alternatives = []
+        for pii_type, pattern in self.patterns.items():
+            source = pattern.pattern
+            if pattern.flags & re.IGNORECASE:
+                source = f'(?i:{source})'
+            alternatives.append(f'(?P<{pii_type.upper()}>{source})')
+        combined = re.compile('|'.join(alternatives))
+        if re2 is None:
+            return combined
+        
+        fast_alternatives = [_re2_source(source) for source in alternatives]
+        if None in fast_alternatives:
+            return combined
+        fast = re2.compile('|'.join(fast_alternatives))
+        for sample in _ENGINE_PARITY_SAMPLES:
+            expected = [(match.lastgroup, match.span()) for match in combined.finditer(sample)]
+            actual = [(match.lastgroup, match.span()) for match in fast.finditer(sample)]
+            if actual != expected:
+                logging.warning(f"RE2 and re disagree on PII pattern matches for {sample!r}; using re")
+                return combined
+        return fast
+    
+    @cached_property
+    def _name_ac(self):
+        """Automaton over all known names, or None without pyahocorasick"""
+        if ahocorasick is None:
+            return None
+        automaton = ahocorasick.Automaton()
+        for name in self.common_first_names | self.common_last_names:
+            automaton.add_word(name, name)
+        automaton.make_automaton()
+        return automaton
+    
     def detect_names(self, text: str) -> List[Tuple[str, int, int]]:
         """Detect potential names in text"""
+        text_lower = text.lower()
+        # Lowercasing can change the length of some non-ASCII text, which
+        # would shift positions, so only use the automaton when it does not
+        if self._name_ac is not None and len(text_lower) == len(text):
+            return self._detect_names_ac(text, text_lower)
+        
+        # Walk the text word by word, where a word is a run of \w characters,
+        # and keep capitalized ASCII words that are known names
         names = []
-        words = re.findall(r'\b[A-Z][a-z]+\b', text)
+        position = 0
+        length = len(text)
+        while position < length:
+            if not _is_word_char(text[position]):
+                position += 1
+                continue
+            start = position
+            while position < length and _is_word_char(text[position]):
+                position += 1
+            word = text[start:position]
+            if word.isascii() and word.isalpha() and word[0].isupper() and word[1:].islower():
+                word_lower = sys.intern(word.lower())
+                if word_lower in self.common_first_names or word_lower in self.common_last_names:
+                    names.append((word, start, position))
         
-        for word in words:
-            word_lower = word.lower()
-            if word_lower in self.common_first_names or word_lower in self.common_last_names:
-                # Find all occurrences of this name in the text
-                for match in re.finditer(r'\b' + re.escape(word) + r'\b', text):
-                    names.append((word, match.start(), match.end()))
+        return names
+    
+    def _detect_names_ac(self, text: str, text_lower: str) -> List[Tuple[str, int, int]]:
+        """Detect capitalized, whole-word names with the Aho-Corasick automaton"""
+        names = []
+        for end_index, name in self._name_ac.iter(text_lower):
+            start = end_index - len(name) + 1
+            end = end_index + 1
+            word = text[start:end]
+            # Same shape as the regex path: one uppercase ASCII letter followed
+            # by lowercase ASCII letters, bounded by non-word characters
+            if not (word.isascii() and word[0].isupper() and word[1:].islower()):
+                continue
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            names.append((word, start, end))
         
         return names
     
@@ -72,19 +236,19 @@ class PIIDetector:
             domain = original_parts[1].lower()
             if any(corp in domain for corp in ['gmail', 'yahoo', 'hotmail', 'outlook']):
                 # Use generic domain for personal emails
-                return f"{random.choice(fake_names)}@{random.choice(domains)}"
+                return f"{self._rng.choice(fake_names)}@{self._rng.choice(domains)}"
             else:
                 # Keep similar structure for business emails
-                return f"{random.choice(fake_names)}@example-company.com"
+                return f"{self._rng.choice(fake_names)}@example-company.com"
         
-        return f"{random.choice(fake_names)}@{random.choice(domains)}"
+        return f"{self._rng.choice(fake_names)}@{self._rng.choice(domains)}"
     
     def _generate_fake_phone(self, original: str) -> str:
         """Generate a fake phone number maintaining format"""
         # Generate fake numbers in 555 range (reserved for fiction)
-        area_code = random.choice(['555', '123', '456'])
-        exchange = random.randint(100, 999)
-        number = random.randint(1000, 9999)
+        area_code = self._rng.choice(['555', '123', '456'])
+        exchange = self._rng.randint(100, 999)
+        number = self._rng.randint(1000, 9999)
         
         # Maintain original formatting
         if '(' in original and ')' in original:
@@ -99,7 +263,7 @@ class PIIDetector:
     def _generate_fake_ssn(self, original: str) -> str:
         """Generate a fake SSN maintaining format"""
         # Use 999 prefix which is not issued
-        fake_ssn = f"999{random.randint(10, 99)}{random.randint(1000, 9999)}"
+        fake_ssn = f"999{self._rng.randint(10, 99)}{self._rng.randint(1000, 9999)}"
         
         # Maintain original formatting
         if '-' in original:
@@ -109,9 +273,9 @@ class PIIDetector:
     
     def _generate_fake_date(self, original: str) -> str:
         """Generate a fake date maintaining format"""
-        fake_month = random.randint(1, 12)
-        fake_day = random.randint(1, 28)  # Safe day for all months
-        fake_year = random.randint(1960, 2000)
+        fake_month = self._rng.randint(1, 12)
+        fake_day = self._rng.randint(1, 28)  # Safe day for all months
+        fake_year = self._rng.randint(1960, 2000)
         
         # Maintain original format
         if '/' in original:
@@ -133,24 +297,21 @@ class PIIDetector:
         fake_streets = ['Oak', 'Pine', 'Maple', 'Cedar', 'Elm', 'Main', 'First', 'Second']
         
         # Extract street type from original
-        street_types = ['Street', 'St', 'Avenue', 'Ave', 'Road', 'Rd', 'Boulevard', 'Blvd', 
-                       'Lane', 'Ln', 'Drive', 'Dr', 'Court', 'Ct', 'Place', 'Pl']
-        
         street_type = 'Street'  # default
-        for st_type in street_types:
+        for st_type in _STREET_TYPES:
             if st_type.lower() in original.lower():
                 street_type = st_type
                 break
         
-        return f"{random.choice(fake_numbers)} {random.choice(fake_streets)} {street_type}"
+        return f"{self._rng.choice(fake_numbers)} {self._rng.choice(fake_streets)} {street_type}"
     
     def _generate_fake_zip(self, original: str) -> str:
         """Generate a fake ZIP code maintaining format"""
-        fake_zip = random.randint(10000, 99999)
+        fake_zip = self._rng.randint(10000, 99999)
         
         # Maintain format with +4 if present
         if '-' in original:
-            fake_plus4 = random.randint(1000, 9999)
+            fake_plus4 = self._rng.randint(1000, 9999)
             return f"{fake_zip}-{fake_plus4}"
         else:
             return str(fake_zip)
@@ -162,104 +323,82 @@ class PIIDetector:
         
         # Check if it's likely a first name or last name based on common patterns
         if original.lower() in self.common_first_names:
-            return random.choice(fake_first_names)
+            return self._rng.choice(fake_first_names)
         elif original.lower() in self.common_last_names:
-            return random.choice(fake_last_names)
+            return self._rng.choice(fake_last_names)
         else:
             # Default to first name
-            return random.choice(fake_first_names)
-    
-    def _get_replacement_generators(self):
-        """Get replacement generators dictionary"""
-        return {
-            'email': self._generate_fake_email,
-            'phone': self._generate_fake_phone,
-            'ssn': self._generate_fake_ssn,
-            'date_of_birth': self._generate_fake_date,
-            'address': self._generate_fake_address,
-            'zip_code': self._generate_fake_zip,
-            'name': self._generate_fake_name
-        }
+            return self._rng.choice(fake_first_names)
     
     def redact_pii(self, text: str) -> Tuple[str, List[Dict]]:
         """
         Redact PII from text and return both redacted text and list of redactions
         Returns: (redacted_text, redactions_list)
         """
-        redacted_text = text
+        redacted_text, redactions = self._redact_cache(text)
+        # Fresh dicts each call, so callers cannot modify the cached result
+        return redacted_text, [
+            {
+                'type': pii_type,
+                'original_value': value,
+                'position': position,
+                'replacement': replacement
+            }
+            for pii_type, value, position, replacement in redactions
+        ]
+    
+    def _redact_pii_impl(self, text: str) -> Tuple[str, Tuple[Tuple[str, str, int, str], ...]]:
+        """
+        Redact PII from text
+        Returns: (redacted_text, redactions as (type, original_value, position, replacement) tuples)
+        """
         redactions = []
         
-        # Track offset changes due to replacements
-        offset = 0
-        
         # Store all matches with their positions
         all_matches = []
         
-        # Detect emails
-        for match in self.patterns['email'].finditer(text):
-            all_matches.append(('EMAIL', match.group(), match.start(), match.end()))
-        
-        # Detect phone numbers
-        for match in self.patterns['phone'].finditer(text):
-            all_matches.append(('PHONE', match.group(), match.start(), match.end()))
-        
-        # Detect SSNs
-        for match in self.patterns['ssn'].finditer(text):
-            all_matches.append(('SSN', match.group(), match.start(), match.end()))
-        
-        # Detect dates of birth
-        for match in self.patterns['date_of_birth'].finditer(text):
-            all_matches.append(('DATE_OF_BIRTH', match.group(), match.start(), match.end()))
-        
-        # Detect addresses
-        for match in self.patterns['address'].finditer(text):
-            all_matches.append(('ADDRESS', match.group(), match.start(), match.end()))
-        
-        # Detect zip codes
-        for match in self.patterns['zip_code'].finditer(text):
-            all_matches.append(('ZIP_CODE', match.group(), match.start(), match.end()))
+        # Detect emails, phone numbers, SSNs, dates of birth, addresses and zip codes
+        for match in self._combined.finditer(text):
+            all_matches.append((match.lastgroup, match.group(), match.start(), match.end()))
         
         # Detect names
         name_matches = self.detect_names(text)
         for name, start, end in name_matches:
             all_matches.append(('NAME', name, start, end))
         
-        # Sort matches by position (reverse order to maintain positions when replacing)
-        all_matches.sort(key=lambda x: x[2], reverse=True)
-        
-        # Remove overlapping matches (keep the first one found)
+        # Sweep matches left to right, longest first at equal starts, and keep
+        # each one that begins after the previously kept match ends
+        all_matches.sort(key=lambda x: (x[2], -x[3]))
         filtered_matches = []
+        cur_end = -1
         for match in all_matches:
-            pii_type, value, start, end = match
-            # Check if this match overlaps with any already accepted match
-            overlaps = False
-            for existing in filtered_matches:
-                _, _, ex_start, ex_end = existing
-                if not (end <= ex_start or start >= ex_end):  # Overlaps
-                    overlaps = True
-                    break
-            if not overlaps:
+            _, _, start, end = match
+            if start >= cur_end:
                 filtered_matches.append(match)
+                cur_end = end
         
-        # Apply realistic replacements
-        replacement_generators = self._get_replacement_generators()
+        # Apply realistic replacements, collecting the untouched spans and
+        # replacements in order and joining them once at the end
+        parts = []
+        cursor = 0
         for pii_type, value, start, end in filtered_matches:
             # Generate appropriate replacement based on PII type
-            if pii_type.lower() in replacement_generators:
-                replacement = replacement_generators[pii_type.lower()](value)
+            generator = self._replacement_generators.get(pii_type.lower())
+            if generator is not None:
+                replacement = generator(value)
             else:
                 replacement = f"[SYNTHETIC_{pii_type}]"
             
-            redacted_text = redacted_text[:start] + replacement + redacted_text[end:]
+            parts.append(text[cursor:start])
+            parts.append(replacement)
+            cursor = end
             
-            redactions.append({
-                'type': pii_type,
-                'original_value': value,
-                'position': start,
-                'replacement': replacement
-            })
+            redactions.append((pii_type, value, start, replacement))
+        
+        parts.append(text[cursor:])
+        redacted_text = ''.join(parts)
         
-        return redacted_text, redactions
+        return redacted_text, tuple(redactions)
     
     def get_supported_pii_types(self) -> List[str]:
         """Return list of supported PII types"""